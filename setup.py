@@ -49,9 +49,7 @@ setup(
     ],
     python_requires='>=3.8',
     keywords='irc log colorizer html wsgi',
-    extras_require=dict(test=[
-        "zope.testing",
-    ]),
+    extras_require=dict(test=[]),
     packages=['irclog2html'],
     package_dir={'': 'src'},
     include_package_data=True,
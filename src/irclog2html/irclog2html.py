@@ -104,24 +104,32 @@ class LogParser(object):
     SERVER = Enum('SERVER')
     OTHER = Enum('OTHER')
 
+    # A time, or failing that a Unix timestamp, in a single match
     TIME_REGEXP = re.compile(
-        r'^\[?(' # Optional [
+        r'^(?:\[?(?P<time>' # Optional [
         r'(?:\d{4}-\d{2}-\d{2}T|\d{2}-\w{3}-\d{4} |\w{3} \d{2} |\d{2} \w{3} )?' # Optional date
-        r'\d\d:\d\d(:\d\d)?' # Mandatory HH:MM, optional :SS
-        r')\]? +') # Optional ], mandatory space
-    TIMESTAMP_REGEXP = re.compile(r'^(\d+) +')
-    NICK_REGEXP = re.compile(r'^<(.*?)(!.*?)?>\s')
-    DIRCPROXY_NICK_REGEXP = re.compile(r'^<(.*?)(!.*)?>\s[\+-]?')
-    JOIN_REGEXP = re.compile(r'^(?:\*\*\*|-->|-!-)\s.*joined')
-    PART_REGEXP = re.compile(r'^(?:\*\*\*|<--|-!-)\s.*(quit|left)')
-    SERVMSG_REGEXP = re.compile(r'^(?:\*\*\*|---|-!-)\s')
-    NICK_CHANGE_REGEXP = re.compile(
-        r'^(?:\*\*\*|---|-!-)\s+(.*?) (?:are|is) now known as (.*)')
+        r'\d\d:\d\d(?::\d\d)?' # Mandatory HH:MM, optional :SS
+        r')\]?' # Optional ]
+        r'|(?P<timestamp>\d+)' # or seconds since the epoch
+        r') +') # Mandatory space
+    # Line types, tried in order; the name of the alternative that matched
+    # tells us what kind of event the line is.
+    LINE_TYPES = (
+        r'|(?P<ACTION>\*[ \t])'
+        r'|(?P<JOIN>(?:\*\*\*|-->|-!-)\s.*joined)'
+        r'|(?P<PART>(?:\*\*\*|<--|-!-)\s.*(?:quit|left))'
+        r'|(?P<NICKCHANGE>(?:\*\*\*|---|-!-)\s+'
+        r'(?P<oldnick>.*?) (?:are|is) now known as (?P<newnick>.*))'
+        r'|(?P<SERVER>(?:\*\*\*|---|-!-)\s)')
+    LINE_REGEXP = re.compile(
+        r'(?P<COMMENT><(?P<nick>.*?)(?:!.*?)?>\s)' + LINE_TYPES)
+    DIRCPROXY_LINE_REGEXP = re.compile(
+        r'(?P<COMMENT><(?P<nick>.*?)(?:!.*)?>\s[\+-]?)' + LINE_TYPES)
 
     def __init__(self, infile, dircproxy=False):
         self.infile = infile
         if dircproxy:
-            self.NICK_REGEXP = self.DIRCPROXY_NICK_REGEXP
+            self.LINE_REGEXP = self.DIRCPROXY_LINE_REGEXP
 
     @staticmethod
     def decode(s):
@@ -145,41 +153,29 @@ class LogParser(object):
                 continue
 
             m = self.TIME_REGEXP.match(line)
-            if m:
-                time = m.group(1)
-                line = line[len(m.group(0)):]
-            else:
+            if m is None:
                 time = None
-
-            if time is None:
-                m = self.TIMESTAMP_REGEXP.match(line)
-                if m:
+            else:
+                time = m.group('time')
+                if time is None:
                     time = datetime.datetime.fromtimestamp(
-                        int(m.group(1)), datetime.timezone.utc
+                        int(m.group('timestamp')), datetime.timezone.utc
                     ).strftime('%Y-%m-%dT%H:%M:%S')
-                    line = line[len(m.group(0)):]
-
-            m = self.NICK_REGEXP.match(line)
-            if m:
-                nick = m.group(1)
-                text = line[len(m.group(0)):]
+                line = line[m.end():]
+
+            m = self.LINE_REGEXP.match(line)
+            if m is None:
+                yield time, self.OTHER, line
+            elif m.lastgroup == 'COMMENT':
+                nick = m.group('nick')
+                text = line[m.end():]
                 yield time, self.COMMENT, (nick, text)
-            elif line.startswith('* ') or line.startswith('*\t'):
-                yield time, self.ACTION, line
-            elif self.JOIN_REGEXP.match(line):
-                yield time, self.JOIN, line
-            elif self.PART_REGEXP.match(line):
-                yield time, self.PART, line
+            elif m.lastgroup == 'NICKCHANGE':
+                oldnick = m.group('oldnick')
+                newnick = m.group('newnick')
+                yield time, self.NICKCHANGE, (line, oldnick, newnick)
             else:
-                m = self.NICK_CHANGE_REGEXP.match(line)
-                if m:
-                    oldnick = m.group(1)
-                    newnick = m.group(2)
-                    yield time, self.NICKCHANGE, (line, oldnick, newnick)
-                elif self.SERVMSG_REGEXP.match(line):
-                    yield time, self.SERVER, line
-                else:
-                    yield time, self.OTHER, line
+                yield time, getattr(self, m.lastgroup), line
 
 
 def open_log_file(filename):
@@ -329,6 +325,10 @@ def createlinks(text):
     return URL_REGEXP.sub(r'<a href="\1" rel="nofollow">\1</a>', text)
 
 
+# str.translate() table that deletes ASCII control characters
+CONTROL_CHARS = dict.fromkeys(range(0x20))
+
+
 def escape(s):
     """Replace ampersands, pointies, control characters.
 
@@ -340,9 +340,17 @@ def escape(s):
         >>> print(escape('[%s]' % ''.join([chr(x) for x in range(32)])))
         []
 
+    Other non-printable characters are kept
+
+        >>> escape('\\x7f\\xa0\\x01')
+        '\\x7f\\xa0'
+
     """
     s = s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
-    return ''.join([c for c in s if ord(c) > 0x1F])
+    if s.isprintable():
+        # no control characters, which is by far the most common case
+        return s
+    return s.translate(CONTROL_CHARS)
 
 
 #
@@ -360,7 +368,8 @@ class AbstractStyle(object):
     description = "Single-line description"
     charset = 'US-ASCII'
 
-    def __init__(self, outfile, *, outfilename='', colours=None):
+    def __init__(self, outfile, *, outfilename='', colours=None,
+                 line_buffering=True):
         """Create a text formatter for writing to outfile.
 
         The ``colours`` dictionary may have the following items:
@@ -371,10 +380,13 @@ class AbstractStyle(object):
         - nickchange
         - action
 
+        Output is flushed to ``outfile`` after every line, unless you pass
+        ``line_buffering=False``, in which case it's up to you to call
+        ``self.outfile.flush()`` when you need it.
         """
         self.outfile = io.TextIOWrapper(outfile, encoding=self.charset,
                                         errors='xmlcharrefreplace',
-                                        line_buffering=True)
+                                        line_buffering=line_buffering)
         self.outfilename = os.path.basename(outfilename)
         self.colours = colours or {}
         self._anchors = set()
@@ -692,28 +704,28 @@ class XHTMLTableStyle(XHTMLStyle):
     prefix = '<table class="irclog">'
     suffix = '</table>'
 
+    # These get called for every line, and f-strings are a lot faster than
+    # str.format(), which parses the template again on every call.
+
     def servermsg(self, time, what, text, link=''):
         text = escape(text)
         text = createlinks(text)
+        css_class = self.CLASSMAP[what]
         if time:
+            anchor = self.timestamp_anchor(time)
+            link = link or self.outfilename
+            time = shorttime(time)
             print(
-                '<tr id="{anchor}">'
-                '<td class="{css_class}" colspan="2">{text}</td>'
-                '<td><a href="{link}#{anchor}" class="time">{time}</a></td>'
-                '</tr>'.format(
-                    anchor=self.timestamp_anchor(time),
-                    css_class=self.CLASSMAP[what],
-                    text=text,
-                    link=link or self.outfilename,
-                    time=shorttime(time)),
+                f'<tr id="{anchor}">'
+                f'<td class="{css_class}" colspan="2">{text}</td>'
+                f'<td><a href="{link}#{anchor}" class="time">{time}</a></td>'
+                '</tr>',
                 file=self.outfile)
         else:
             print(
                 '<tr>'
-                '<td class="{css_class}" colspan="3">{text}</td>'
-                '</tr>'.format(
-                    css_class=self.CLASSMAP[what],
-                    text=text),
+                f'<td class="{css_class}" colspan="3">{text}</td>'
+                '</tr>',
                 file=self.outfile)
 
     def nicktext(self, time, nick, text, htmlcolour, link=''):
@@ -721,31 +733,24 @@ class XHTMLTableStyle(XHTMLStyle):
         text = escape(text)
         text = createlinks(text)
         text = text.replace('  ', '&nbsp;&nbsp;')
-        link = link or self.outfilename
         if time:
+            anchor = self.timestamp_anchor(time)
+            link = link or self.outfilename
+            time = shorttime(time)
             print(
-                '<tr id="{anchor}">'
-                '<th class="nick" style="background: {color}">{nick}</th>'
-                '<td class="text" style="color: {color}">{text}</td>'
+                f'<tr id="{anchor}">'
+                f'<th class="nick" style="background: {htmlcolour}">{nick}</th>'
+                f'<td class="text" style="color: {htmlcolour}">{text}</td>'
                 '<td class="time">'
-                '<a href="{link}#{anchor}" class="time">{time}</a></td>'
-                '</tr>'.format(
-                    anchor=self.timestamp_anchor(time),
-                    color=htmlcolour,
-                    nick=nick,
-                    text=text,
-                    link=link,
-                    time=shorttime(time)),
+                f'<a href="{link}#{anchor}" class="time">{time}</a></td>'
+                '</tr>',
                 file=self.outfile)
         else:
             print(
                 '<tr>'
-                '<th class="nick" style="background: {color}">{nick}</th>'
-                '<td class="text" colspan="2" style="color: {color}">{text}</td>'
-                '</tr>'.format(
-                    color=htmlcolour,
-                    nick=nick,
-                    text=text),
+                f'<th class="nick" style="background: {htmlcolour}">{nick}</th>'
+                f'<td class="text" colspan="2" style="color: {htmlcolour}">{text}</td>'
+                '</tr>',
                 file=self.outfile)
 
 
@@ -945,9 +950,12 @@ def main(argv=sys.argv):
                      % (parser.prog, outfilename, e))
         try:
             parser = LogParser(infile, dircproxy=options.dircproxy)
-            formatter = style(outfile, outfilename=outfilename, colours=colours)
+            # don't flush (and make a write() syscall) after every line
+            formatter = style(outfile, outfilename=outfilename, colours=colours,
+                              line_buffering=False)
             convert_irc_log(parser, formatter, title or filename,
                             prev, index, next, searchbox=options.searchbox)
+            formatter.outfile.flush()
             css_file = os.path.join(os.path.dirname(outfilename), 'irclog.css')
             if not os.path.exists(css_file) and os.path.exists(CSS_FILE):
                 shutil.copy(CSS_FILE, css_file)
@@ -26,8 +26,8 @@ import os
 import re
 import sys
 import time
-from contextlib import closing
-from urllib.parse import quote
+import zlib
+from urllib.parse import parse_qsl, quote
 
 from .irclog2html import (
     HOMEPAGE,
@@ -37,7 +37,6 @@ from .irclog2html import (
     NickColourizer,
     XHTMLTableStyle,
     escape,
-    open_log_file,
 )
 from .logs2html import find_log_files
 
@@ -56,6 +55,17 @@ DEFAULT_LOGFILE_PATTERN = "*.log"
 
 DATE_REGEXP = re.compile(r'^.*(\d\d\d\d)-(\d\d)-(\d\d)')
 
+READ_BLOCK_SIZE = 256 * 1024
+
+# (where, logfile_pattern) -> (directory mtime, sorted list of LogFiles)
+LOG_FILES_CACHE = {}
+
+# Directory mtimes are only as precise as the clock tick of the kernel (or
+# 1-2 seconds on some filesystems), so a file created right after we list the
+# directory might not change its mtime.  Listings of directories modified
+# less than this long ago are not cached.
+RACY_MTIME_NS = 2 * 10**9
+
 
 HEADER = """\
 <!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN"
@@ -97,6 +107,8 @@ class SearchStats(object):
 class SearchResult(object):
     """Search result -- a single utterance."""
 
+    __slots__ = ('filename', 'link', 'date', 'time', 'event', 'info')
+
     def __init__(self, filename, link, date, time, event, info):
         self.filename = filename
         self.link = link
@@ -112,7 +124,8 @@ class SearchResultFormatter(object):
     def __init__(self, stream=None):
         self.stream = stream
         bstream = stream.buffer
-        self.style = XHTMLTableStyle(bstream)
+        # rows are buffered and written out in bulk by print_suffix()
+        self.style = XHTMLTableStyle(bstream, line_buffering=False)
         self.nick_colour = NickColourizer()
 
     def print_prefix(self):
@@ -133,6 +146,7 @@ class SearchResultFormatter(object):
             self.style.servermsg(result.time, result.event, text, link)
 
     def print_suffix(self):
+        self.style.outfile.flush()
         print(self.style.suffix, file=self.stream)
 
 
@@ -140,10 +154,96 @@ def urlescape(link):
     return escape(quote(link))
 
 
-def parse_log_file(filename):
-    with closing(open_log_file(filename)) as f:
-        for row in LogParser(f):
-            yield row
+def find_log_files_cached(where, logfile_pattern):
+    """Find log files, reusing the last result if the directory is unchanged.
+
+    A long-running WSGI app would otherwise list the same directory for every
+    search request.  Returns a new list that the caller may modify.
+    """
+    if os.sep in logfile_pattern or (os.altsep and
+                                     os.altsep in logfile_pattern):
+        # the files might live in a subdirectory, whose mtime we don't check
+        return find_log_files(where, logfile_pattern)
+    try:
+        mtime = os.stat(where).st_mtime_ns
+    except OSError:
+        return find_log_files(where, logfile_pattern)
+    key = (where, logfile_pattern)
+    cached = LOG_FILES_CACHE.get(key)
+    if cached is None or cached[0] != mtime:
+        files = find_log_files(where, logfile_pattern)
+        if time.time_ns() - mtime < RACY_MTIME_NS:
+            LOG_FILES_CACHE.pop(key, None)
+            return files
+        cached = LOG_FILES_CACHE[key] = (mtime, files)
+    return list(cached[1])
+
+
+def iter_log_lines(filename):
+    """Iterate over the lines of a log file, which may be gzipped.
+
+    The file is read (and decompressed) in big blocks, which is a lot
+    faster than letting GzipFile hand out lines one at a time.  Yields
+    bytestrings without the trailing newline.
+    """
+    if filename.endswith('.gz'):
+        decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    else:
+        decompressor = None
+    tail = b''
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(READ_BLOCK_SIZE)
+            if not data:
+                break
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+                # gzip files may consist of several concatenated members,
+                # and may have zero padding after them, which GzipFile
+                # skips, so we do too
+                while decompressor.eof:
+                    rest = decompressor.unused_data.lstrip(b'\0')
+                    if not rest:
+                        break
+                    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+                    data += decompressor.decompress(rest)
+            lines = (tail + data).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                yield line
+    if decompressor is not None:
+        tail += decompressor.flush()
+    if tail:
+        for line in tail.split(b'\n'):
+            yield line
+
+
+def prefilter_lines(lines, query, stats):
+    """Skip raw log lines that cannot possibly contain the query.
+
+    Looking for a substring in the raw bytes is a lot cheaper than parsing
+    every line with LogParser.  Skipped lines still count in stats.lines.
+
+    Only plain ASCII queries without whitespace can be checked this way:
+    whitespace could span the boundary between the nick and the message,
+    which look different in the raw line (``<nick> text``) than in what
+    search_irc_logs() matches against (``nick text``).
+    """
+    if not query.isascii() or any(c.isspace() for c in query):
+        return lines
+    needle = query.lower().encode('ascii')
+    # 'İ'.lower() contains an 'i', and the Kelvin sign lowercases to 'k'
+    check_non_ascii = any(c in b'ik' for c in needle)
+
+    def filtered():
+        for line in lines:
+            if needle in line.lower() or (check_non_ascii
+                                          and not line.isascii()):
+                yield line
+            elif line.rstrip(b'\r'):
+                stats.lines += 1
+
+    return filtered()
 
 
 def search_irc_logs(query, stats=None, where=DEFAULT_LOGFILE_PATH,
@@ -151,13 +251,14 @@ def search_irc_logs(query, stats=None, where=DEFAULT_LOGFILE_PATH,
     if not stats:
         stats = SearchStats() # will be discarded, but, oh, well
     query = query.lower()
-    files = find_log_files(where, logfile_pattern)
+    files = find_log_files_cached(where, logfile_pattern)
     files.reverse() # newest first
     for f in files:
         date = f.date
         link = f.link
         stats.files += 1
-        for timestamp, event, info in parse_log_file(f.filename):
+        lines = prefilter_lines(iter_log_lines(f.filename), query, stats)
+        for timestamp, event, info in LogParser(lines):
             if event == LogParser.COMMENT:
                 nick, text = info
                 text = nick + ' ' + text
@@ -264,11 +365,17 @@ def main():  # pragma: nocover
     cgitb.enable()
     logfile_path = os.getenv('IRCLOG_LOCATION') or DEFAULT_LOGFILE_PATH
     logfile_pattern = os.getenv('IRCLOG_GLOB') or DEFAULT_LOGFILE_PATTERN
-    form = cgi.FieldStorage()
-    stream = unicode_stdout()
+    form = dict(parse_qsl(os.environ.get('QUERY_STRING', '')))
+    # build the whole response in memory, like the WSGI app does, and send it
+    # out with one write instead of flushing stdout after every line
+    stream = io.TextIOWrapper(io.BytesIO(), 'ascii',
+                              errors='xmlcharrefreplace',
+                              line_buffering=True)
     print_cgi_headers(stream)
-    query = form["q"].value if "q" in form else None
+    query = form.get('q')
     search_page(stream, query, logfile_path, logfile_pattern)
+    sys.stdout.buffer.write(stream.buffer.getvalue())
+    sys.stdout.buffer.flush()
 
 
 if __name__ == '__main__':
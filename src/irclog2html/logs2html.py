@@ -10,8 +10,12 @@ Looks for *.log in a given directory.  Needs an ISO 8601 date (YYYY-MM-DD or
 YYYYMMDD) in the filename.
 """
 
+import concurrent.futures
 import datetime
+import fnmatch
 import glob
+import io
+import itertools
 import optparse
 import os
 import re
@@ -35,6 +39,8 @@ from .irclog2html import HOMEPAGE, RELEASE, VERSION, escape
 # something like /usr/share/irclog2html/irclog.css, I imagine
 CSS_FILE = os.path.join(os.path.dirname(__file__), 'irclog.css')
 
+MAX_WINDOWS_JOBS = 61
+
 
 DATE_REGEXP = re.compile(r'^.*(\d\d\d\d)-?(\d\d)-?(\d\d)')
 
@@ -82,12 +88,17 @@ class LogFile:
 
     def uptodate(self):
         """Check whether the HTML version of the log is up to date."""
-        log_mtime = os.stat(self.filename).st_mtime
+        # integer nanoseconds don't suffer from float rounding
+        log_mtime = os.stat(self.filename).st_mtime_ns
         try:
-            html_mtime = os.stat(self.html_filename).st_mtime
+            html_mtime = os.stat(self.html_filename).st_mtime_ns
         except OSError:
-            return False
-        return html_mtime > log_mtime
+            html_mtime = None
+        if not hasattr(self, '_newfile'):
+            # we've just checked whether the html file exists, so there's
+            # no need for newfile() to look again
+            self._newfile = html_mtime is None
+        return html_mtime is not None and html_mtime > log_mtime
 
     def generate(self, style, title_prefix='', prev=None, next=None,
                  extra_args=()):
@@ -114,11 +125,27 @@ def find_log_files(directory, pattern='*.log', output_dir=None):
 
     Returns a sorted list of LogFile objects (oldest first).
     """
-    pattern = os.path.join(directory, pattern)
+    if os.sep in pattern or (os.altsep and os.altsep in pattern):
+        pattern = os.path.join(directory, pattern)
+        filenames = glob.glob(pattern) + glob.glob(pattern + '.gz')
+    else:
+        # list the directory once instead of globbing it twice
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        if not pattern.startswith('.'):
+            # glob skips hidden files too
+            names = [name for name in names if not name.startswith('.')]
+        filenames = [
+            os.path.join(directory, name)
+            for name in (fnmatch.filter(names, pattern)
+                         + fnmatch.filter(names, pattern + '.gz'))
+        ]
     # ISO 8601 dates sort the way we need them
     return sorted([
         LogFile(filename, output_dir=output_dir)
-        for filename in glob.glob(pattern) + glob.glob(pattern + '.gz')
+        for filename in filenames
     ], key=attrgetter('filename'))
 
 
@@ -155,17 +182,16 @@ def write_index(outfile, title, logfiles, searchbox=False, latest_log_link=None)
                link), file=outfile)
         print('</ul>', file=outfile)
     print('<ul>', file=outfile)
-    current_month = None
-    for logfile in logfiles:
-        month = logfile.date.strftime('%Y-%m')
-        if month != current_month:
-            current_month = month
-            print('</ul>', file=outfile)
-            print('<h2>%s</h2>' % month, file=outfile)
-            print('<ul>', file=outfile)
-        link = escape(quote(logfile.link))
-        title = escape(logfile.title)
-        print('<li><a href="%s">%s</a></li>' % (link, title), file=outfile)
+    for month, month_logfiles in itertools.groupby(
+            logfiles, key=lambda logfile: logfile.date.strftime('%Y-%m')):
+        print('</ul>', file=outfile)
+        print('<h2>%s</h2>' % month, file=outfile)
+        print('<ul>', file=outfile)
+        for logfile in month_logfiles:
+            link = escape(quote(logfile.link))
+            title = escape(logfile.title)
+            print('<li><a href="%s">%s</a></li>' % (link, title),
+                  file=outfile)
     print('</ul>', file=outfile)
     print("""
 <div class="generatedby">
@@ -211,9 +237,15 @@ def main(argv=sys.argv):
     parser.add_option('-o', '--output-dir', dest="output_dir", default=None,
                       help="destination output directory"
                            " (default: same as input directory)")
+    parser.add_option('-j', '--jobs', type='int', dest="jobs",
+                      default=None,
+                      help="number of log files to convert in parallel"
+                           " (default: number of CPUs)")
     options, args = parser.parse_args(argv[1:])
     if len(args) < 1:
         parser.error("missing directory name")
+    if options.jobs is not None and options.jobs < 1:
+        parser.error("--jobs must be at least 1")
     if len(args) > 1:
         parser.error("too many arguments")
     dir = args[0]
@@ -242,6 +274,7 @@ def process(dir, options):
                 raise Error("Failed to create directory %s: %s" % (out_dir, e))
     logfiles = find_log_files(dir, options.pattern, options.output_dir)
     logfiles.reverse() # newest first
+    to_generate = []
     for n, logfile in enumerate(logfiles):
         if n > 0:
             next = logfiles[n - 1]
@@ -253,6 +286,27 @@ def process(dir, options):
             prev = None
         if (options.force or not logfile.uptodate()
                 or prev and prev.newfile() or next and next.newfile()):
+            to_generate.append((logfile, prev, next))
+    jobs = getattr(options, 'jobs', 1)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if sys.platform == 'win32':
+        # ProcessPoolExecutor refuses to use more processes than this
+        jobs = min(jobs, MAX_WINDOWS_JOBS)
+    # don't start processes that would have nothing to do
+    jobs = min(jobs, len(to_generate))
+    if jobs > 1:
+        # every log file is converted independently
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            futures = [
+                executor.submit(logfile.generate, options.style,
+                                options.prefix, prev, next, extra_args)
+                for logfile, prev, next in to_generate
+            ]
+            for future in futures:
+                future.result()
+    else:
+        for logfile, prev, next in to_generate:
             logfile.generate(options.style, options.prefix, prev, next,
                              extra_args)
     latest_log_link = None
@@ -260,15 +314,24 @@ def process(dir, options):
         latest_log_link = 'latest.log.html'
         move_symlink(logfiles[0].link, os.path.join(out_dir, latest_log_link))
     outfilename = os.path.join(out_dir, 'index.html')
+    index = io.StringIO()
+    write_index(index, options.title, logfiles, options.searchbox,
+                latest_log_link)
+    index = index.getvalue()
+    # leave the index alone (and its mtime unchanged) when no log files were
+    # added, so that web caches and rsync don't see a change
     try:
-        outfile = open(outfilename, 'w')
-    except IOError as e:
-        raise Error("cannot open %s for writing: %s" % (outfilename, e))
-    try:
-        write_index(outfile, options.title, logfiles, options.searchbox,
-                    latest_log_link)
-    finally:
-        outfile.close()
+        with open(outfilename) as f:
+            unchanged = f.read() == index
+    except (IOError, ValueError):
+        unchanged = False
+    if not unchanged:
+        try:
+            outfile = open(outfilename, 'w')
+        except IOError as e:
+            raise Error("cannot open %s for writing: %s" % (outfilename, e))
+        with outfile:
+            outfile.write(index)
     css_file = os.path.join(out_dir, 'irclog.css')
     if not os.path.exists(css_file) and os.path.exists(CSS_FILE):
         shutil.copy(CSS_FILE, css_file)
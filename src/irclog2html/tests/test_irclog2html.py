@@ -1,4 +1,6 @@
+import codecs
 import doctest
+import gzip
 import os
 import shutil
 import sys
@@ -266,6 +268,9 @@ class BytesIOWrapper(object):
 
     def __init__(self, stream):
         self.stream = stream
+        # an incremental decoder copes with multibyte characters that are
+        # split between two writes
+        self.decode = codecs.getincrementaldecoder(self.charset)().decode
 
     def readable(self):
         return False
@@ -280,8 +285,7 @@ class BytesIOWrapper(object):
         self.stream.flush()
 
     def write(self, bytestr):
-        self.stream.write(bytestr.decode(self.charset))
-        self.stream.flush()
+        self.stream.write(self.decode(bytestr))
 
 
 def doctest_AbstractStyle_timestamp_anchor_duplicate_timestamps():
@@ -803,6 +807,36 @@ def doctest_main():
     """
 
 
+def doctest_main_gzipped_log():
+    """Test for main
+
+    Gzipped log files are decompressed on the fly
+
+        >>> tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+        >>> os.mkdir(os.path.join(tmpdir, 'plain'))
+        >>> os.mkdir(os.path.join(tmpdir, 'gzipped'))
+        >>> fn = os.path.join(tmpdir, 'plain', 'sample.log')
+        >>> _ = shutil.copyfile(os.path.join(here, 'sample.log'), fn)
+        >>> gzfn = os.path.join(tmpdir, 'gzipped', 'sample.log.gz')
+        >>> with open(fn, 'rb') as f, gzip.open(gzfn, 'wb') as gz:
+        ...     _ = gz.write(f.read())
+        >>> run(fn, '-t', 'sample')
+        >>> run(gzfn, '-t', 'sample')
+
+    The output file is named after the uncompressed file, and has the same
+    contents
+
+        >>> with open(fn + '.html', 'rb') as f:
+        ...     expected = f.read()
+        >>> with open(os.path.join(tmpdir, 'gzipped', 'sample.log.html'), 'rb') as f:
+        ...     f.read() == expected
+        True
+
+        >>> shutil.rmtree(tmpdir)
+
+    """
+
+
 def doctest_main_can_handle_output_errors():
     """Test for main
 
@@ -1,18 +1,24 @@
+import atexit
+import codecs
 import datetime
 import doctest
+import functools
 import gzip
 import os
 import shutil
 import sys
 import tempfile
 import unittest
-from contextlib import closing
 from unittest import mock
 
 from irclog2html.irclogsearch import (
+    LOG_FILES_CACHE,
     LogParser,
     SearchResult,
     SearchResultFormatter,
+    SearchStats,
+    find_log_files_cached,
+    iter_log_lines,
     main,
     print_search_form,
     print_search_results,
@@ -36,6 +42,9 @@ class BytesIOWrapper(object):
 
     def __init__(self, stream):
         self.stream = stream
+        # an incremental decoder copes with multibyte characters that are
+        # split between two writes
+        self.decode = codecs.getincrementaldecoder(self.charset)().decode
 
     def readable(self):
         return False
@@ -50,8 +59,7 @@ class BytesIOWrapper(object):
         self.stream.flush()
 
     def write(self, bytestr):
-        self.stream.write(bytestr.decode(self.charset))
-        self.stream.flush()
+        self.stream.write(self.decode(bytestr))
 
 
 def prepare_stdout():
@@ -61,17 +69,6 @@ def prepare_stdout():
     sys.stdout.buffer = BytesIOWrapper(sys.stdout)
 
 
-def myrepr(o):
-    """Repr that drops u prefixes on unicode strings."""
-    if isinstance(o, tuple):
-        if len(o) == 1:
-            return '(%s, )' % ', '.join(map(myrepr, o))
-        else:
-            return '(%s)' % ', '.join(map(myrepr, o))
-    else:
-        return repr(o)
-
-
 def skipIf(condition: bool):
     """Skip a doctest if condition is false."""
     def wrapper(fn):
@@ -93,38 +90,60 @@ def doctest_SearchResultFormatter():
         ...     filename='/path/to/log', link='log.html',
         ...     date=datetime.date(2013, 3, 17), time='12:34',
         ...     event=LogParser.COMMENT, info=('mgedmin', 'hi')))
-        <tr id="t12:34"><th class="nick" style="background: #407a40">mgedmin</th><td class="text" style="color: #407a40">hi</td><td class="time"><a href="log.html#t12:34" class="time">12:34</a></td></tr>
 
         >>> srf.print_html(SearchResult(
         ...     filename='/path/to/log', link='log.html',
         ...     date=datetime.date(2013, 3, 17), time='12:35',
         ...     event=LogParser.NICKCHANGE, info=('mgedmin is now known as mg_away', 'mgedmin', 'mg_away')))
-        <tr id="t12:35"><td class="nickchange" colspan="2">mgedmin is now known as mg_away</td><td><a href="log.html#t12:35" class="time">12:35</a></td></tr>
 
         >>> srf.print_html(SearchResult(
         ...     filename='/path/to/log', link='log.html',
         ...     date=datetime.date(2013, 3, 17), time='12:36',
         ...     event=LogParser.ACTION, info='* mgedmin jumps up and down'))
-        <tr id="t12:36"><td class="action" colspan="2">* mgedmin jumps up and down</td><td><a href="log.html#t12:36" class="time">12:36</a></td></tr>
+
+    The rows are buffered and written out together with the suffix
 
         >>> srf.print_suffix()
+        <tr id="t12:34"><th class="nick" style="background: #407a40">mgedmin</th><td class="text" style="color: #407a40">hi</td><td class="time"><a href="log.html#t12:34" class="time">12:34</a></td></tr>
+        <tr id="t12:35"><td class="nickchange" colspan="2">mgedmin is now known as mg_away</td><td><a href="log.html#t12:35" class="time">12:35</a></td></tr>
+        <tr id="t12:36"><td class="action" colspan="2">* mgedmin jumps up and down</td><td><a href="log.html#t12:36" class="time">12:36</a></td></tr>
         </table>
 
     """
 
 
-def gzip_copy(src, dst):
-    with open(src, 'rb') as fi:
-        with closing(gzip.open(dst, 'wb')) as fo:
-            shutil.copyfileobj(fi, fo)
+@functools.lru_cache(maxsize=1)
+def set_up_sample():
+    """Create a directory with sample logs, shared by all tests.
+
+    Don't modify it; use copy_sample() if you need to do that.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+    atexit.register(shutil.rmtree, tmpdir, ignore_errors=True)
+    with open(os.path.join(here, 'sample.log'), 'rb') as f:
+        data = f.read()
+    with open(os.path.join(tmpdir, 'sample-2013-03-17.log.gz'), 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=1))
+    with open(os.path.join(tmpdir, 'sample-2013-03-18.log'), 'wb') as f:
+        f.write(data)
+    return tmpdir
+
 
+def copy_sample():
+    """Create a private copy of the sample log directory.
 
-def set_up_sample():
+    The files are hard links when possible, so replace them instead of
+    modifying them in place.  Call clean_up_sample() when you're done.
+    """
+    sample = set_up_sample()
     tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
-    gzip_copy(os.path.join(here, 'sample.log'),
-              os.path.join(tmpdir, 'sample-2013-03-17.log.gz'))
-    shutil.copy(os.path.join(here, 'sample.log'),
-                os.path.join(tmpdir, 'sample-2013-03-18.log'))
+    for name in os.listdir(sample):
+        src = os.path.join(sample, name)
+        dst = os.path.join(tmpdir, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
     return tmpdir
 
 
@@ -132,12 +151,124 @@ def clean_up_sample(tmpdir):
     shutil.rmtree(tmpdir)
 
 
+def doctest_find_log_files_cached():
+    """Test for find_log_files_cached
+
+        >>> tmpdir = copy_sample()
+        >>> os.utime(tmpdir, ns=(10**18, 10**18))
+        >>> [f.link for f in find_log_files_cached(tmpdir, '*.log')]
+        ['sample-2013-03-17.log.html', 'sample-2013-03-18.log.html']
+
+    The same list is returned as long as the directory does not change
+
+        >>> files = find_log_files_cached(tmpdir, '*.log')
+        >>> files[0] is find_log_files_cached(tmpdir, '*.log')[0]
+        True
+
+    but you get a new list each time, so you can modify it
+
+        >>> files.reverse()
+        >>> [f.link for f in find_log_files_cached(tmpdir, '*.log')]
+        ['sample-2013-03-17.log.html', 'sample-2013-03-18.log.html']
+
+    When a new log file appears, the directory is listed again
+
+        >>> shutil.copy(os.path.join(here, 'sample.log'),
+        ...             os.path.join(tmpdir, 'sample-2013-03-19.log'))
+        '...sample-2013-03-19.log'
+        >>> os.utime(tmpdir, ns=(0, 0))
+        >>> [f.link for f in find_log_files_cached(tmpdir, '*.log')]
+        ['sample-2013-03-17.log.html', 'sample-2013-03-18.log.html', 'sample-2013-03-19.log.html']
+
+    Directories modified in the last couple of seconds are listed every
+    time, because their mtime might not change when another file is created
+    in the same clock tick
+
+        >>> os.utime(tmpdir)
+        >>> files = find_log_files_cached(tmpdir, '*.log')
+        >>> files[0] is find_log_files_cached(tmpdir, '*.log')[0]
+        False
+        >>> (tmpdir, '*.log') in LOG_FILES_CACHE
+        False
+
+    Nonexistent directories are not a problem
+
+        >>> find_log_files_cached(os.path.join(tmpdir, 'nosuchdir'), '*.log')
+        []
+
+    Patterns that look into subdirectories bypass the cache
+
+        >>> [f.link for f in find_log_files_cached(os.path.dirname(tmpdir),
+        ...                                        os.path.join(os.path.basename(tmpdir), '*.log'))]
+        ['sample-2013-03-17.log.html', 'sample-2013-03-18.log.html', 'sample-2013-03-19.log.html']
+
+    and so do ones that use the alternative separator (on Windows)
+
+        >>> where = os.path.dirname(tmpdir)
+        >>> pattern = os.path.basename(tmpdir) + '/*.log'
+        >>> with mock.patch.multiple(os, sep='\\\\', altsep='/'):
+        ...     [f.link for f in find_log_files_cached(where, pattern)]
+        ['sample-2013-03-17.log.html', 'sample-2013-03-18.log.html', 'sample-2013-03-19.log.html']
+        >>> (where, pattern) in LOG_FILES_CACHE
+        False
+
+        >>> clean_up_sample(tmpdir)
+
+    """
+
+
+def doctest_iter_log_lines():
+    r"""Test for iter_log_lines
+
+    Lines are carried over across read block boundaries, and gzipped files
+    that consist of several members are read until the very end:
+
+        >>> tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+        >>> filename = os.path.join(tmpdir, 'sample-2013-03-19.log.gz')
+        >>> with open(filename, 'wb') as f:
+        ...     _ = f.write(gzip.compress(b'first line\nsecond '))
+        ...     _ = f.write(gzip.compress(b'line\r\nno newline'))
+        >>> with mock.patch('irclog2html.irclogsearch.READ_BLOCK_SIZE', 7):
+        ...     for line in iter_log_lines(filename):
+        ...         print(repr(line))
+        b'first line'
+        b'second line\r'
+        b'no newline'
+
+    Zero padding after a member is skipped, like GzipFile does
+
+        >>> with open(filename, 'wb') as f:
+        ...     _ = f.write(gzip.compress(b'first line\n') + b'\0' * 10)
+        ...     _ = f.write(gzip.compress(b'second line\n') + b'\0' * 512)
+        >>> with mock.patch('irclog2html.irclogsearch.READ_BLOCK_SIZE', 7):
+        ...     for line in iter_log_lines(filename):
+        ...         print(repr(line))
+        b'first line'
+        b'second line'
+
+    Plain log files are read the same way
+
+        >>> filename = os.path.join(tmpdir, 'sample-2013-03-20.log')
+        >>> with open(filename, 'wb') as f:
+        ...     _ = f.write(b'first line\n\nthird line\n')
+        >>> with mock.patch('irclog2html.irclogsearch.READ_BLOCK_SIZE', 7):
+        ...     for line in iter_log_lines(filename):
+        ...         print(repr(line))
+        b'first line'
+        b''
+        b'third line'
+
+        >>> clean_up_sample(tmpdir)
+
+    """
+
+
 def doctest_search_irc_logs():
     """Test for search_irc_logs
 
         >>> tmpdir = set_up_sample()
         >>> for r in search_irc_logs('seen', where=tmpdir):
-        ...     print('%s %s %s %s %s' % (r.link, r.date, r.time, r.event, myrepr(r.info)))
+        ...     print('%s %s %s %s %s' % (r.link, r.date, r.time, r.event, repr(r.info)))
         sample-2013-03-18.log.html 2013-03-18 2005-01-08T23:47:17 COMMENT ('mgedmin', 'seen mgedmin')
         sample-2013-03-18.log.html 2013-03-18 2005-01-08T23:47:19 COMMENT ('mgedmin', '!seen mgedmin')
         sample-2013-03-18.log.html 2013-03-18 2005-01-08T23:47:19 COMMENT ('povbot', 'mgedmin: mgedmin was last seen in #pov 2 seconds ago saying: <mgedmin> seen mgedmin')
@@ -145,8 +276,6 @@ def doctest_search_irc_logs():
         sample-2013-03-17.log.html 2013-03-17 2005-01-08T23:47:19 COMMENT ('mgedmin', '!seen mgedmin')
         sample-2013-03-17.log.html 2013-03-17 2005-01-08T23:47:19 COMMENT ('povbot', 'mgedmin: mgedmin was last seen in #pov 2 seconds ago saying: <mgedmin> seen mgedmin')
 
-        >>> clean_up_sample(tmpdir)
-
     """
 
 
@@ -155,11 +284,66 @@ def doctest_search_irc_logs_limit():
 
         >>> tmpdir = set_up_sample()
         >>> for r in search_irc_logs('seen', where=tmpdir, limit=2):
-        ...     print('%s %s %s %s %s' % (r.link, r.date, r.time, r.event, myrepr(r.info)))
+        ...     print('%s %s %s %s %s' % (r.link, r.date, r.time, r.event, repr(r.info)))
         sample-2013-03-18.log.html 2013-03-18 2005-01-08T23:47:17 COMMENT ('mgedmin', 'seen mgedmin')
         sample-2013-03-18.log.html 2013-03-18 2005-01-08T23:47:19 COMMENT ('mgedmin', '!seen mgedmin')
 
-        >>> clean_up_sample(tmpdir)
+    """
+
+
+def doctest_search_irc_logs_stats():
+    """Test for search_irc_logs
+
+    Lines that are skipped without parsing are still counted
+
+        >>> tmpdir = set_up_sample()
+        >>> stats = SearchStats()
+        >>> for r in search_irc_logs('seen', stats=stats, where=tmpdir):
+        ...     pass
+        >>> stats.files, stats.lines, stats.matches
+        (2, 20, 6)
+
+    Queries can span the nick and the text of a message
+
+        >>> stats = SearchStats()
+        >>> for r in search_irc_logs('mgedmin !seen', stats=stats, where=tmpdir):
+        ...     print('%s %s %s %s' % (r.date, r.time, r.event, repr(r.info)))
+        2013-03-18 2005-01-08T23:47:19 COMMENT ('mgedmin', '!seen mgedmin')
+        2013-03-17 2005-01-08T23:47:19 COMMENT ('mgedmin', '!seen mgedmin')
+        >>> stats.files, stats.lines, stats.matches
+        (2, 20, 2)
+
+    """
+
+
+def doctest_search_irc_logs_case_insensitive():
+    r"""Test for search_irc_logs
+
+    Searches ignore case the way str.lower() does
+
+        >>> tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+        >>> with open(os.path.join(tmpdir, 'chan-2013-03-19.log'), 'wb') as f:
+        ...     _ = f.write('<mg> SOME text\n'
+        ...                 '<mg> \u017fome text\n'
+        ...                 '<mg> \u0130stanbul\n'
+        ...                 '<mg> 300 \u212a\n'.encode('UTF-8'))
+        >>> def search(query):
+        ...     for r in search_irc_logs(query, where=tmpdir):
+        ...         print(ascii(r.info))
+        >>> search('some')
+        ('mg', 'SOME text')
+
+    Non-ASCII letters that lowercase to ASCII ones are found too
+
+        >>> search('i')
+        ('mg', '\u0130stanbul')
+        >>> search('istanbul')
+        >>> search('300 k')
+        ('mg', '300 \u212a')
+        >>> search('k')
+        ('mg', '300 \u212a')
+
+        >>> shutil.rmtree(tmpdir)
 
     """
 
@@ -246,8 +430,6 @@ def doctest_print_search_results():
         </body>
         </html>
 
-        >>> clean_up_sample(tmpdir)
-
     """
 
 
@@ -372,13 +554,12 @@ def doctest_main_searches():
         </div>
         </body>
         </html>
-        >>> clean_up_sample(tmpdir)
 
     """
 
 
 def test_suite():
-    optionflags = (doctest.ELLIPSIS | doctest.REPORT_NDIFF |
+    optionflags = (doctest.ELLIPSIS | doctest.REPORT_UDIFF |
                    doctest.NORMALIZE_WHITESPACE)
     return unittest.TestSuite([
         doctest.DocTestSuite(optionflags=optionflags),
@@ -6,8 +6,8 @@ import io
 import os
 import shutil
 import tempfile
+import types
 import unittest
-from contextlib import closing
 from unittest import mock
 
 from irclog2html.irclogserver import application, dir_listing, parse_path
@@ -16,19 +16,15 @@ from irclog2html.irclogserver import application, dir_listing, parse_path
 here = os.path.dirname(__file__)
 
 
-def gzip_copy(src, dst):
-    with open(src, 'rb') as fi:
-        with closing(gzip.open(dst, 'wb')) as fo:
-            shutil.copyfileobj(fi, fo)
-
-
 def set_up_sample():
     tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+    with open(os.path.join(here, 'sample.log'), 'rb') as f:
+        sample = f.read()
     os.mkdir(os.path.join(tmpdir, '.hidden'))
-    gzip_copy(os.path.join(here, 'sample.log'),
-              os.path.join(tmpdir, 'sample-2013-03-17.log.gz'))
-    shutil.copy(os.path.join(here, 'sample.log'),
-                os.path.join(tmpdir, 'sample-2013-03-18.log'))
+    with open(os.path.join(tmpdir, 'sample-2013-03-17.log.gz'), 'wb') as f:
+        f.write(gzip.compress(sample, compresslevel=1))
+    with open(os.path.join(tmpdir, 'sample-2013-03-18.log'), 'wb') as f:
+        f.write(sample)
     with open(os.path.join(tmpdir, "index.html"), "w") as f:
         f.write("This is the index")
     with open(os.path.join(tmpdir, "font.css"), "w") as f:
@@ -36,11 +32,19 @@ def set_up_sample():
     os.mkdir(os.path.join(tmpdir, "#chan"))
     with open(os.path.join(tmpdir, "#chan", "index.html"), "w") as f:
         f.write("#chan index")
-    shutil.copy(os.path.join(here, 'sample.log'),
-                os.path.join(tmpdir, '#chan', 'sample-2013-03-18.log'))
+    with open(os.path.join(tmpdir, '#chan', 'sample-2013-03-18.log'),
+              'wb') as f:
+        f.write(sample)
     return tmpdir
 
 
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
 def clean_up_sample(tmpdir):
     shutil.rmtree(tmpdir)
 
@@ -101,14 +105,16 @@ def doctest_parse_path():
 
 class TestDirListing(unittest.TestCase):
 
+    def setUp(self):
+        patcher = mock.patch('irclog2html.irclogserver.find_channels')
+        self.mock_find_channels = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def make_channel(self, name, age):
-        m = mock.Mock(age=age)  # can't pass name here :(
-        m.name = name
-        return m
+        return types.SimpleNamespace(name=name, age=age)
 
-    @mock.patch('irclog2html.irclogserver.find_channels')
-    def test_dir_listing_old_an_new(self, mock_find_channels):
-        mock_find_channels.return_value = [
+    def test_dir_listing_old_an_new(self):
+        self.mock_find_channels.return_value = [
             self.make_channel(name='#cobwebs', age=datetime.timedelta(days=7.5)),
             self.make_channel(name='#rainbows', age=datetime.timedelta(minutes=5)),
             self.make_channel(name='#puppies', age=datetime.timedelta(days=6.5)),
@@ -121,17 +127,15 @@ class TestDirListing(unittest.TestCase):
         self.assertIn('#puppies', response)
         self.assertIn('<h2>Old channels</h2>', response)
         self.assertIn('#cobwebs', response)
-        self.assertTrue(
-            response.index('Active channels') <
-            response.index('#rainbows') <
-            response.index('#puppies') <
-            response.index('Old channels') <
-            response.index('#cobwebs')
-        )
-
-    @mock.patch('irclog2html.irclogserver.find_channels')
-    def test_dir_listing_old(self, mock_find_channels):
-        mock_find_channels.return_value = [
+        positions = [
+            response.index(s) for s in ['Active channels', '#rainbows',
+                                        '#puppies', 'Old channels',
+                                        '#cobwebs']
+        ]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_dir_listing_old(self):
+        self.mock_find_channels.return_value = [
             self.make_channel(name='#cobwebs', age=datetime.timedelta(days=7.5)),
         ]
         stream = io.StringIO()
@@ -141,9 +145,8 @@ class TestDirListing(unittest.TestCase):
         self.assertNotIn('<h2>Old channels</h2>', response)
         self.assertIn('#cobwebs', response)
 
-    @mock.patch('irclog2html.irclogserver.find_channels')
-    def test_dir_listing_new(self, mock_find_channels):
-        mock_find_channels.return_value = [
+    def test_dir_listing_new(self):
+        self.mock_find_channels.return_value = [
             self.make_channel(name='#rainbows', age=datetime.timedelta(minutes=5)),
             self.make_channel(name='#puppies', age=datetime.timedelta(days=6.5)),
         ]
@@ -155,9 +158,8 @@ class TestDirListing(unittest.TestCase):
         self.assertIn('#rainbows', response)
         self.assertIn('#puppies', response)
 
-    @mock.patch('irclog2html.irclogserver.find_channels')
-    def test_dir_listing_empty(self, mock_find_channels):
-        mock_find_channels.return_value = []
+    def test_dir_listing_empty(self):
+        self.mock_find_channels.return_value = []
         stream = io.StringIO()
         dir_listing(stream, '/all/my/logs')
         response = stream.getvalue()
@@ -170,28 +172,56 @@ class Response(object):
     pass
 
 
+class StartResponse(object):
+    """WSGI start_response() that remembers how it was called."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, status, headers, exc_info=None):
+        self.calls.append((status, headers))
+
+
 class TestApplication(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        # the tests only read the sample, so they can share it
+        cls.sample = set_up_sample()
+
+    @classmethod
+    def tearDownClass(cls):
+        clean_up_sample(cls.sample)
+
     def setUp(self):
-        self.tmpdir = set_up_sample()
+        self.tmpdir = self.sample
+
+    def use_private_sample(self):
+        """Switch to a copy of the sample that the test can modify.
 
-    def tearDown(self):
-        clean_up_sample(self.tmpdir)
+        The files are hard links when possible, so the test may delete
+        them, but must not modify them in place.
+        """
+        self.tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+        self.addCleanup(clean_up_sample, self.tmpdir)
+        shutil.copytree(self.sample, self.tmpdir, dirs_exist_ok=True,
+                        copy_function=link_or_copy)
 
     def request(self, path='/', expect=200, extra_env=None):
+        path_info, _, query_string = path.partition('?')
         environ = {
             'IRCLOG_LOCATION': self.tmpdir,
-            'PATH_INFO': path.partition('?')[0],
-            'QUERY_STRING': path.partition('?')[-1],
+            'PATH_INFO': path_info,
+            'QUERY_STRING': query_string,
             'wsgi.input': None,
         }
         if extra_env:
             environ.update(extra_env)
-        start_response = mock.Mock()
+        start_response = StartResponse()
         response = Response()
         response.body = b''.join(application(environ, start_response))
-        self.assertEqual(start_response.call_count, 1)
-        status, headers = start_response.call_args[0]
+        self.assertEqual(len(start_response.calls), 1)
+        status, headers = start_response.calls[0]
         response.status_string = status
         response.status = int(status.split()[0])
         response.header_list = headers
@@ -207,6 +237,7 @@ class TestApplication(unittest.TestCase):
         self.assertEqual(response.content_type, 'text/html; charset=UTF-8')
 
     def test_root_without_index_html(self):
+        self.use_private_sample()
         os.unlink(os.path.join(self.tmpdir, 'index.html'))
         response = self.request('/')
         self.assertEqual(response.content_type, 'text/html; charset=UTF-8')
@@ -301,6 +332,7 @@ class TestApplication(unittest.TestCase):
         self.assertEqual(response.location, '%23chan/')
 
     def test_chan_index_without_index_html(self):
+        self.use_private_sample()
         os.unlink(os.path.join(self.tmpdir, '#chan', 'index.html'))
         response = self.request(
             '/#chan/',
@@ -343,19 +375,16 @@ class TestApplication(unittest.TestCase):
             b'<td class="join" colspan="2">*** povbot has joined #pov</td>',
             response.body)
 
-    @mock.patch("os.environ")
-    def test_chan_os_environ(self, environ):
-        os.environ.get = {"IRCLOG_CHAN_DIR": self.tmpdir}.get
-        response = self.request('/')
+    def test_chan_os_environ(self):
+        with mock.patch.dict(os.environ, {"IRCLOG_CHAN_DIR": self.tmpdir}):
+            response = self.request('/')
         self.assertEqual(response.content_type, 'text/html; charset=UTF-8')
         self.assertIn(b'IRC logs', response.body)
         self.assertIn(b'<a href="%23chan/">#chan</a>', response.body)
 
-    @mock.patch("os.environ")
-    def test_chan_search_page_os_environ(self, environ):
-        os.environ.get = {"IRCLOG_CHAN_DIR": self.tmpdir}.get
-        response = self.request(
-            '/#chan/search')
+    def test_chan_search_page_os_environ(self):
+        with mock.patch.dict(os.environ, {"IRCLOG_CHAN_DIR": self.tmpdir}):
+            response = self.request('/#chan/search')
         self.assertEqual(response.content_type, 'text/html; charset=UTF-8')
         self.assertIn(b'<title>Search IRC logs</title>', response.body)
 
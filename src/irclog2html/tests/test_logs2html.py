@@ -1,3 +1,4 @@
+import concurrent.futures
 import datetime
 import doctest
 import optparse
@@ -7,6 +8,7 @@ import sys
 import tempfile
 import time
 import unittest
+from unittest import mock
 
 from irclog2html.logs2html import (
     Error,
@@ -91,6 +93,13 @@ class TestLogFile(TestCase):
         lf = self.LogFile('somechannel-20130317.log')
         self.assertFalse(lf.uptodate())
 
+    def test_uptodate_remembers_newness(self):
+        self.create('somechannel-20130317.log')
+        lf = self.LogFile('somechannel-20130317.log')
+        self.assertFalse(lf.uptodate())
+        self.create('somechannel-20130317.log.html')
+        self.assertTrue(lf.newfile())
+
     def test_uptodate_html_is_newer(self):
         self.create('somechannel-20130317.log', mtime=-100)
         self.create('somechannel-20130317.log.html', mtime=-50)
@@ -135,6 +144,26 @@ class TestLogFile(TestCase):
                           self.LogFile('somechannel-20130317.log'),
                           self.LogFile('somechannel-20130318.log')])
 
+    def test_find_log_files_gz_and_hidden(self):
+        self.create('somechannel-20130316.log.gz')
+        self.create('somechannel-20130317.log')
+        self.create('.somechannel-20130318.log')
+        self.assertEqual(find_log_files(self.tmpdir),
+                         [self.LogFile('somechannel-20130316.log.gz'),
+                          self.LogFile('somechannel-20130317.log')])
+        self.assertEqual(find_log_files(self.tmpdir, '.*.log'),
+                         [self.LogFile('.somechannel-20130318.log')])
+
+    def test_find_log_files_in_subdirectory(self):
+        os.mkdir(self.filename('2013'))
+        filename = os.path.join('2013', 'somechannel-20130316.log')
+        self.create(filename)
+        self.assertEqual(find_log_files(self.tmpdir, '*/*.log'),
+                         [self.LogFile(filename)])
+
+    def test_find_log_files_no_directory(self):
+        self.assertEqual(find_log_files(self.filename('nosuchdir')), [])
+
     def test_move_symlink(self):
         if not hasattr(os, 'symlink'):
             self.skipTest("platform does not support symlinks")
@@ -181,6 +210,24 @@ class TestLogFile(TestCase):
             self.assertTrue(os.path.exists(self.filename('latest.log.html')))
         self.assertTrue(os.path.exists(self.filename('irclog.css')))
 
+    def test_process_leaves_unchanged_index_alone(self):
+        self.create('somechannel-20130316.log', mtime=-10)
+        self.create('somechannel-20130316.log.html')
+        options = optparse.Values(dict(searchbox=True, dircproxy=True,
+                                       pattern='*.log', force=False,
+                                       prefix='IRC logs for ', output_dir=None,
+                                       style='xhtmltable', title='IRC logs'))
+        process(self.tmpdir, options)
+        index_mtime = self.start_time - 100
+        os.utime(self.filename('index.html'), (index_mtime, index_mtime))
+        process(self.tmpdir, options)
+        self.assertEqual(os.stat(self.filename('index.html')).st_mtime,
+                         index_mtime)
+        self.create('somechannel-20130317.log')
+        process(self.tmpdir, options)
+        self.assertNotEqual(os.stat(self.filename('index.html')).st_mtime,
+                            index_mtime)
+
     def test_process_handles_write_errors(self):
         self.create('somechannel-20130316.log', mtime=-10)
         self.create('somechannel-20130316.log.html')
@@ -244,6 +291,50 @@ class TestLogFile(TestCase):
         self.assertTrue(os.path.exists(
             self.filename('somechannel-20130318.log.html')))
 
+    def test_main_jobs(self):
+        for jobs in ['1', '2']:
+            self.create('somechannel-20130317.log', mtime=-10)
+            self.create('somechannel-20130318.log', mtime=-10)
+            main(['logs2html', '--jobs', jobs, self.tmpdir])
+            self.assertTrue(os.path.exists(
+                self.filename('somechannel-20130317.log.html')))
+            self.assertTrue(os.path.exists(
+                self.filename('somechannel-20130318.log.html')))
+            os.unlink(self.filename('somechannel-20130317.log.html'))
+            os.unlink(self.filename('somechannel-20130318.log.html'))
+
+    def run_main_counting_processes(self, *args):
+        # run the jobs in threads, so we can see how big the pool would be
+        with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                        side_effect=concurrent.futures.ThreadPoolExecutor,
+                        ) as pool:
+            main(['logs2html'] + list(args) + [self.tmpdir])
+        return [c.args[0] for c in pool.call_args_list]
+
+    def test_main_jobs_limited_by_files(self):
+        self.create('somechannel-20130316.log', mtime=-10)
+        self.create('somechannel-20130317.log', mtime=-10)
+        self.create('somechannel-20130318.log', mtime=-10)
+        self.assertEqual(self.run_main_counting_processes('--jobs', '8'), [3])
+
+    def test_main_jobs_default(self):
+        self.create('somechannel-20130317.log', mtime=-10)
+        self.create('somechannel-20130318.log', mtime=-10)
+        with mock.patch('os.cpu_count', return_value=4):
+            self.assertEqual(self.run_main_counting_processes(), [2])
+        self.create('somechannel-20130319.log', mtime=-10)
+        with mock.patch('os.cpu_count', return_value=None):
+            self.assertEqual(self.run_main_counting_processes(), [])
+
+    def test_main_jobs_on_windows(self):
+        self.create('somechannel-20130316.log', mtime=-10)
+        self.create('somechannel-20130317.log', mtime=-10)
+        self.create('somechannel-20130318.log', mtime=-10)
+        with mock.patch('sys.platform', 'win32'), \
+                mock.patch('irclog2html.logs2html.MAX_WINDOWS_JOBS', 2):
+            self.assertEqual(self.run_main_counting_processes('--jobs', '8'),
+                             [2])
+
     def test_main_error_handling(self):
         self.create('nodate.log')
         self.assertRaises(SystemExit, main, ['logs2html', self.tmpdir])
@@ -333,6 +424,18 @@ def doctest_main_missing_dirname():
     """
 
 
+def doctest_main_bad_jobs():
+    """Test for main
+
+        >>> run('--jobs', '0', '/tmp')
+        Usage: logs2html [options] directory
+        <BLANKLINE>
+        logs2html: error: --jobs must be at least 1
+        SystemExit(2)
+
+    """
+
+
 def doctest_main_extra_args():
     """Test for main
 
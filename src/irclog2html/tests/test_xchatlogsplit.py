@@ -0,0 +1,123 @@
+import doctest
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from irclog2html.xchatlogsplit import main, parse_line_time
+
+
+def strptime(line):
+    return time.strptime(line[:15], '%b %d %H:%M:%S')
+
+
+def doctest_parse_line_time():
+    """Test for parse_line_time
+
+        >>> parse_line_time('Jan 08 23:47:17 <mgedmin>\\thello\\n')[:6]
+        (1900, 1, 8, 23, 47, 17)
+
+    Unusual timestamps are left to time.strptime()
+
+        >>> with mock.patch('time.strptime', wraps=time.strptime) as fallback:
+        ...     parse_line_time('Jan  8 23:47:17 <mgedmin>\\thello\\n')[:6]
+        (1900, 1, 8, 23, 47, 17)
+        >>> fallback.called
+        True
+
+    which refuses non-English month names (in the C locale)
+
+        >>> with mock.patch('time.strptime', wraps=time.strptime) as fallback:
+        ...     parse_line_time('Sau 08 23:47:17 <mgedmin>\\thello\\n')
+        Traceback (most recent call last):
+          ...
+        ValueError: time data 'Sau 08 23:47:17' does not match format '%b %d %H:%M:%S'
+        >>> fallback.called
+        True
+
+    Lines that don't start with a timestamp are rejected
+
+        >>> parse_line_time('<mgedmin>\\thello\\n')
+        Traceback (most recent call last):
+          ...
+        ValueError: time data '<mgedmin>\\thello' does not match format '%b %d %H:%M:%S'
+
+    """
+
+
+class TestParseLineTime(unittest.TestCase):
+
+    def assertSameAsStrptime(self, line):
+        try:
+            expected = strptime(line)[:6]
+        except ValueError:
+            self.assertRaises(ValueError, parse_line_time, line)
+        else:
+            self.assertEqual(parse_line_time(line)[:6], expected, line)
+
+    def test_dates(self):
+        for month, day in itertools.product(
+                ['Jan', 'Feb', 'Apr', 'Dec', 'Foo'], range(0, 33)):
+            self.assertSameAsStrptime('%s %02d 12:34:56 text' % (month, day))
+
+    def test_times(self):
+        for hour, minute, second in itertools.product(
+                [0, 9, 23, 24, 99], [0, 59, 60], [0, 59, 60, 61, 62]):
+            self.assertSameAsStrptime('Mar 15 %02d:%02d:%02d text'
+                                      % (hour, minute, second))
+
+    def test_odd_formats(self):
+        for line in ['Mar  5 12:34:56 text', 'Mar 15  2:34:56 text',
+                     'Mar 15 12:34:5  text', 'mar 15 12:34:56 text',
+                     'MAR 15 12:34:56 text', 'Mar 15 12-34-56 text',
+                     'Mar 15 1२:34:56 text', 'Mar 15 12:34:56',
+                     'Mar 15 12:34']:
+            self.assertSameAsStrptime(line)
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='irclog2html-test-')
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def read(self, filename):
+        with open(os.path.join(self.tmpdir, filename), 'rb') as f:
+            return f.read().replace(os.linesep.encode(), b'\n')
+
+    def test_main(self):
+        filename = os.path.join(self.tmpdir, 'freenode-#pov.log')
+        with open(filename, 'wb') as f:
+            f.write(b'**** BEGIN LOGGING AT Sat Jan  8 23:47:00 2005\n'
+                    b'\n'
+                    b'Jan 08 23:47:17 <mgedmin>\thi\n'
+                    b'Jan 08 23:59:59 <mgedmin>\tstill here\n'
+                    b'Jan 09 00:00:01 <mgedmin>\tnew day\n'
+                    b'**** ENDING LOGGING AT Sun Jan  9 00:01:00 2005\n'
+                    b'\n')
+        main(['xchatlogsplit', filename])
+        self.assertEqual(
+            sorted(os.listdir(self.tmpdir)),
+            ['#pov.2005-01-08.log', '#pov.2005-01-09.log', 'freenode-#pov.log'])
+        self.assertEqual(
+            self.read('#pov.2005-01-08.log'),
+            b'**** BEGIN LOGGING AT Sat Jan  8 23:47:00 2005\n'
+            b'\n'
+            b'23:47:17 <mgedmin>\thi\n'
+            b'23:59:59 <mgedmin>\tstill here\n')
+        self.assertEqual(
+            self.read('#pov.2005-01-09.log'),
+            b'00:00:01 <mgedmin>\tnew day\n'
+            b'**** ENDING LOGGING AT Sun Jan  9 00:01:00 2005\n'
+            b'\n')
+
+
+def test_suite():
+    optionflags = doctest.NORMALIZE_WHITESPACE | doctest.ELLIPSIS | doctest.REPORT_NDIFF
+    return unittest.TestSuite([
+        doctest.DocTestSuite(optionflags=optionflags),
+        unittest.defaultTestLoader.loadTestsFromName(__name__),
+    ])
@@ -21,11 +21,41 @@ from warnings import warn
 STAMP_RX = re.compile(r'^[*][*][*][*] ((BEGIN|ENDING) LOGGING AT|(LOGINIMAS|ŽURNALAS) (PRADĖTAS|BAIGTAS)) ')
 
 
+MONTHS = {name: n for n, name in enumerate([
+    'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1)}
+
+# time.strptime() accepts Feb 29 when there's no year
+DAYS_IN_MONTH = (None, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def parse_line_time(line):
+    """Parse the 'Mmm DD HH:MM:SS' timestamp at the start of a log line.
+
+    Returns the same year, month, day, hour, minute and second as
+    time.strptime(line[:15], '%b %d %H:%M:%S') (but not the weekday or the
+    day of the year), a lot faster for the common case of English month
+    names and two-digit fields.  Raises ValueError if the line doesn't start
+    with a timestamp.
+    """
+    month = MONTHS.get(line[:3])
+    digits = line[4:6] + line[7:9] + line[10:12] + line[13:15]
+    if (month is not None and line[3:15:3] == '  ::' and len(digits) == 8
+            and digits.isascii() and digits.isdigit()):
+        day, hour, minute, second = [int(digits[i:i + 2]) for i in (0, 2, 4, 6)]
+        if (1 <= day <= DAYS_IN_MONTH[month] and hour <= 23
+                and minute <= 59 and second <= 61):
+            return (1900, month, day, hour, minute, second, 0, 1, -1)
+    return time.strptime(line[:len('Ddd YY HH:MM:SS'):], '%b %d %H:%M:%S')
+
+
 def readxchatlogs(infile):
     date = None
     ymd = None
     for line in infile:
-        m = STAMP_RX.match(line)
+        # most lines aren't log stamps, and a prefix check is cheaper than
+        # a regex match
+        m = line.startswith('****') and STAMP_RX.match(line)
         if m:
             stamp = line[len(m.group(0)):].strip()
             try:
@@ -40,7 +70,7 @@ def readxchatlogs(infile):
         elif line.strip():
             assert date, 'what year?  got only %s' % line
             try:
-                t = time.strptime(line[:len('Ddd YY HH:MM:SS'):], '%b %d %H:%M:%S')
+                t = parse_line_time(line)
             except ValueError:
                 locale.setlocale(locale.LC_TIME, "")
                 try:
@@ -54,8 +84,11 @@ def readxchatlogs(infile):
             if t[:3] < ymd: # new year wraparound
                 warn("Guessing that wraparound occurred: %s -> %s" % (ymd, t[:3]))
                 t = (ymd[0] + 1, ) + t[1:]
-            ymd = t[:3]
-            date = time.strftime("%Y-%m-%d", t)
+            if t[:3] != ymd:
+                # the date only changes once a day, no need to format it
+                # for every line
+                ymd = t[:3]
+                date = time.strftime("%Y-%m-%d", t)
             line = line[len('Ddd YY '):]
         elif not date:
             continue
@@ -83,7 +116,7 @@ def main(argv=sys.argv):
                 if os.path.exists(outfilename):
                     sys.exit("refusing to overwrite %s" % outfilename)
                 outfile = open(outfilename, "a")
-            print(line, end=' ', file=outfile)
+            outfile.write(line)
     if outfile:
         outfile.close()
 